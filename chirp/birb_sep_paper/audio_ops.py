@@ -357,6 +357,28 @@ def LowpassFiltersBatch(batch_size=64, channels=160):
   return envelopes
 
 
+def RolledMask(mask_length, shifts, length):
+  """Mask the first mask_length[b] entries of row b, rolled by shifts[b].
+
+  Rolling row b by shifts[b] moves entry i to (i + shifts[b]) % length, so the
+  rolled mask is computed directly for the whole batch instead of rolling each
+  row separately.
+
+  Args:
+    mask_length: [batch] int64 number of masked (zero) entries per row.
+    shifts: [batch] int64 roll offset per row.
+    length: Static length of each row.
+
+  Returns:
+    A [batch, length] boolean mask, False where masked.
+  """
+  diag = tf.range(length, dtype=tf.int64)
+  diag = tf.math.floormod(
+      tf.expand_dims(diag, 0) - tf.expand_dims(shifts, 1), length
+  )
+  return tf.greater_equal(diag, tf.expand_dims(mask_length, 1))
+
+
 def ApplySpecAugmentMask(target, axis, min_length=0.0, max_length=0.5):
   """Generate 0/1 mask."""
   batch_size = tf.shape(target)[0]
@@ -368,24 +390,12 @@ def ApplySpecAugmentMask(target, axis, min_length=0.0, max_length=0.5):
       masked_portion * tf.cast(target.shape[axis], tf.float32), tf.int64
   )
 
-  diag = tf.range(target.shape.as_list()[axis], dtype=tf.int64)
-  diag = tf.expand_dims(diag, 0)
-  diag = tf.tile(diag, [batch_size, 1])
-  mask = tf.greater_equal(diag, tf.expand_dims(mask_length, 1))
+  # Roll each batch element randomly.
+  shifts = tf.random.uniform(
+      [batch_size], minval=0, maxval=target.shape[axis], dtype=tf.int64
+  )
+  mask = RolledMask(mask_length, shifts, target.shape.as_list()[axis])
   mask = tf.cast(mask, dtype)
-
-  # Roll each batch element randomly...
-  # pylint: disable=g-long-lambda
-  def RandRoll(x):
-    return tf.roll(
-        x,
-        tf.random.uniform(
-            [], minval=0, maxval=target.shape[axis], dtype=tf.int64
-        ),
-        axis=0,
-    )
-
-  mask = tf.map_fn(RandRoll, mask, dtype=mask.dtype, back_prop=False)
   if axis == 1:
     mask = tf.expand_dims(mask, axis=2)
   else:
@@ -234,21 +234,50 @@ def get_bio_pcen_melspec_config(
 
 
 def get_supervised_train_pipeline(
-    config: config_dict.ConfigDict, mixin_prob: float, train_dataset_dir: str
+    config: config_dict.ConfigDict,
+    mixin_prob: float,
+    train_dataset_dir: str,
+    cache_filename: str | None = None,
 ) -> config_dict.ConfigDict:
-  """Create the supervised training data pipeline."""
+  """Create the supervised training data pipeline.
+
+  Args:
+    config: The base config.
+    mixin_prob: The probability of mixing two examples.
+    train_dataset_dir: The training dataset directory.
+    cache_filename: If not None, the examples are cached after the
+      deterministic label conversion, so that decoding and conversion only
+      happen during the first epoch. Shuffling and the random augmentations
+      happen after the cache. An empty string caches in memory, which is only
+      suitable for small datasets. Note that the cache freezes the file order
+      of the first epoch, so later epochs are only reshuffled within the
+      512-element shuffle buffer.
+
+  Returns:
+    The training dataset config.
+  """
+  preprocess_ops = [
+      _c('pipeline.OnlyJaxTypes'),
+      _c(
+          'pipeline.ConvertBirdTaxonomyLabels',
+          source_namespace='ebird2021',
+          target_class_list=config.get_ref('target_class_list'),
+          add_taxonomic_labels=config.get_ref('add_taxonomic_labels'),
+      ),
+  ]
+  shuffle_op = _c('pipeline.Shuffle', shuffle_buffer_size=512)
+  if cache_filename is None:
+    preprocess_ops = [shuffle_op] + preprocess_ops
+  else:
+    preprocess_ops += [
+        _c('pipeline.Cache', filename=cache_filename),
+        shuffle_op,
+    ]
   train_dataset_config = config_dict.ConfigDict()
   train_dataset_config.pipeline = _c(
       'pipeline.Pipeline',
-      ops=[
-          _c('pipeline.Shuffle', shuffle_buffer_size=512),
-          _c('pipeline.OnlyJaxTypes'),
-          _c(
-              'pipeline.ConvertBirdTaxonomyLabels',
-              source_namespace='ebird2021',
-              target_class_list=config.get_ref('target_class_list'),
-              add_taxonomic_labels=config.get_ref('add_taxonomic_labels'),
-          ),
+      ops=preprocess_ops
+      + [
           _c('pipeline.RandomNormalizeAudio', min_gain=0.15, max_gain=0.25),
           _c(
               'pipeline.RandomSlice',
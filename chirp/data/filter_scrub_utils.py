@@ -16,10 +16,11 @@
 """Utilities to filter/scrub data."""
 import enum
 import functools
-from typing import Any, Dict, NamedTuple, Sequence, Union
+from typing import Any, Callable, Dict, NamedTuple, Sequence, Union
 
 from chirp.data import sampling_utils as su
 from chirp.taxonomy import namespace_db
+import numba
 import numpy as np
 import pandas as pd
 
@@ -318,6 +319,159 @@ def append(df: pd.DataFrame, row: dict[str, Any]):
   return new_df
 
 
+@numba.njit(cache=True, boundscheck=False)
+def _isin_sorted_int64(
+    arr: np.ndarray, values_sorted: np.ndarray
+) -> np.ndarray:
+  """Returns a mask of which elements of arr are in values_sorted.
+
+  Args:
+    arr: A 1-D int64 array.
+    values_sorted: A sorted 1-D int64 array.
+
+  Returns:
+    A boolean array of the same length as arr.
+  """
+  num_values = values_sorted.shape[0]
+  mask = np.empty(arr.shape[0], dtype=np.bool_)
+  for i in range(arr.shape[0]):
+    lo, hi = 0, num_values
+    while lo < hi:
+      mid = (lo + hi) // 2
+      if values_sorted[mid] < arr[i]:
+        lo = mid + 1
+      else:
+        hi = mid
+    mask[i] = lo < num_values and values_sorted[lo] == arr[i]
+  return mask
+
+
+def make_scrub(
+    key: str,
+    values: Sequence[SerializableType],
+    all_but: bool = False,
+    replace_value: SerializableType | None = None,
+) -> Callable[[dict[str, Any]], dict[str, Any]]:
+  """Builds a function scrubbing any value in values from feature_dict[key].
+
+  Hashable `values` are converted to a frozenset once, so that applying the
+  returned function to every row of a DataFrame costs O(1) per label instead of
+  O(m) membership tests against `values`. Numeric ndarrays are scrubbed with a
+  compiled binary search (integers) or `np.isin` and stay ndarrays, as long as
+  `replace_value` fits in their dtype; other fields are scrubbed element-wise.
+  Type consistency between `values` and feature_dict[key] is only checked once
+  per element type encountered.
+
+  Args:
+    key: The field from feature_dict used for scrubbing.
+    values: The values that will be scrubbed from feature_dict[key].
+    all_but: If activated, will scrub every value, except those specified.
+    replace_value: If specified, used as a placeholder wherever a value was
+      scrubbed.
+
+  Returns:
+    A function taking a feature_dict and returning a scrubbed copy of it. See
+    `scrub` for details.
+  """
+  try:
+    values_set = frozenset(values)
+    values_array = np.asarray(list(values_set))
+  except TypeError:
+    # Unhashable values (e.g. lists or dicts) are tested for membership
+    # linearly, and always scrubbed element-wise.
+    values_set = list(values)
+    values_array = None
+  # Integer values are sorted once so that integer label arrays can be scrubbed
+  # with the compiled binary search in `_isin_sorted_int64`.
+  if values_array is not None and np.issubdtype(
+      values_array.dtype, np.signedinteger
+  ):
+    values_sorted = np.sort(values_array.astype(np.int64))
+  else:
+    values_sorted = None
+  # Element types of feature_dict[key] which have already been checked against
+  # the types of `values`.
+  checked_types = set()
+
+  def scrub_fn(feature_dict: dict[str, Any]) -> dict[str, Any]:
+    if key not in feature_dict:
+      raise ValueError(
+          f'{key} is not a correct field.'
+          f'Please choose among {list(feature_dict.keys())}'
+      )
+    if type(feature_dict[key]) not in [list, np.ndarray, str]:
+      raise TypeError(
+          'Can only scrub values from str/lists/ndarrays. Current column'
+          'is of type {}'.format(type(feature_dict[key]))
+      )
+    # Using this 'dirty' syntax because feature_dict[key] could be a list or
+    # ndarray -> using the 'not values' to check emptiness does not work.
+    if not values_set or len(feature_dict[key]) == 0:  # pylint: disable=g-explicit-length-test
+      return feature_dict
+    field_type = type(feature_dict[key][0])
+    if field_type not in checked_types:
+      for index, val in enumerate(values):
+        if not isinstance(val, field_type):
+          raise TypeError(
+              'Values[{}] has type {}, while values in feature_dict[{}] have'
+              ' type {}'.format(index, type(val), key, field_type)
+          )
+      checked_types.add(field_type)
+    # Avoid changing the feature_dict in-place.
+    new_feature_dict = feature_dict.copy()
+    # Numeric arrays (e.g. integer labels) are scrubbed in a vectorized way,
+    # unless the replace_value does not fit in the array's dtype: np.where would
+    # then silently promote the whole array (e.g. to strings), so those arrays
+    # go through the element-wise path below.
+    if (
+        values_array is not None
+        and isinstance(feature_dict[key], np.ndarray)
+        and np.issubdtype(feature_dict[key].dtype, np.number)
+        and (
+            replace_value is None
+            or np.can_cast(
+                np.min_scalar_type(replace_value), feature_dict[key].dtype
+            )
+        )
+    ):
+      if (
+          values_sorted is not None
+          and feature_dict[key].ndim == 1
+          and np.issubdtype(feature_dict[key].dtype, np.signedinteger)
+      ):
+        in_values = _isin_sorted_int64(
+            feature_dict[key].astype(np.int64, copy=False), values_sorted
+        )
+      else:
+        in_values = np.isin(feature_dict[key], values_array)
+      scrub_mask = in_values != all_but
+      if replace_value is None:
+        new_feature_dict[key] = feature_dict[key][~scrub_mask]
+      else:
+        new_feature_dict[key] = np.where(
+            scrub_mask, replace_value, feature_dict[key]
+        )
+      return new_feature_dict
+    key_type = type(new_feature_dict[key])
+    if key_type == str:
+      new_feature_dict[key] = new_feature_dict[key].split(' ')
+
+    if replace_value is None:
+      new_feature_dict[key] = [
+          x for x in new_feature_dict[key] if (x in values_set) == all_but
+      ]
+    else:
+      new_feature_dict[key] = [
+          x if (x in values_set) == all_but else replace_value
+          for x in new_feature_dict[key]
+      ]
+    if key_type == str:
+      new_feature_dict[key] = ' '.join(new_feature_dict[key])
+    return new_feature_dict
+
+  return scrub_fn
+
+
 def scrub(
     feature_dict: dict[str, Any],
     key: str,
@@ -327,6 +481,9 @@ def scrub(
 ) -> dict[str, Any]:
   """Removes any occurence of any value in values from feature_dict[key].
 
+  When scrubbing many rows with the same `values`, prefer building the scrubbing
+  function once with `make_scrub`.
+
   Args:
     feature_dict: A dictionary that represents the row (=recording) to be
       potentially scrubbed in a DataFrame.
@@ -344,49 +501,7 @@ def scrub(
     TypeError: any element of 'values' has a type different from the type at
       df[key], or feature_dict[key] is not a str, list or np.ndarray.
   """
-
-  if key not in feature_dict:
-    raise ValueError(
-        f'{key} is not a correct field.'
-        f'Please choose among {list(feature_dict.keys())}'
-    )
-  if type(feature_dict[key]) not in [list, np.ndarray, str]:
-    raise TypeError(
-        'Can only scrub values from str/lists/ndarrays. Current column'
-        'is of type {}'.format(type(feature_dict[key]))
-    )
-  # Using this 'dirty' syntax because values and feature_dict[key] could be
-  # list or ndarray -> using the 'not values' to check emptiness does not work.
-  if len(values) == 0 or len(feature_dict[key]) == 0:  # pylint: disable=g-explicit-length-test
-    return feature_dict
-  field_type = type(feature_dict[key][0])
-  for index, val in enumerate(values):
-    if not isinstance(val, field_type):
-      raise TypeError(
-          'Values[{}] has type {}, while values in feature_dict[{}] have'
-          ' type {}'.format(index, type(val), key, field_type)
-      )
-  # Avoid changing the feature_dict in-place.
-  new_feature_dict = feature_dict.copy()
-  key_type = type(new_feature_dict[key])
-  if key_type == str:
-    new_feature_dict[key] = new_feature_dict[key].split(' ')
-
-  scrub_mask = [True if x in values else False for x in new_feature_dict[key]]
-  if all_but:
-    scrub_mask = [not x for x in scrub_mask]
-  if replace_value is None:
-    new_feature_dict[key] = [
-        x for x, scrub in zip(new_feature_dict[key], scrub_mask) if not scrub
-    ]
-  else:
-    new_feature_dict[key] = [
-        x if not scrub else replace_value
-        for x, scrub in zip(new_feature_dict[key], scrub_mask)
-    ]
-  if key_type == str:
-    new_feature_dict[key] = ' '.join(new_feature_dict[key])
-  return new_feature_dict
+  return make_scrub(key, values, all_but, replace_value)(feature_dict)
 
 
 def filter_df(
@@ -623,10 +738,10 @@ OPS = {
     MaskOp.NOT_IN: is_not_in,
     TransformOp.SAMPLE: su.sample_recordings,
     TransformOp.SCRUB: lambda df, **kwargs: df.apply(
-        functools.partial(scrub, **kwargs), axis=1, result_type='expand'
+        make_scrub(**kwargs), axis=1, result_type='expand'
     ),
     TransformOp.SCRUB_ALL_BUT: lambda df, **kwargs: df.apply(
-        functools.partial(functools.partial(scrub, all_but=True), **kwargs),
+        make_scrub(all_but=True, **kwargs),
         axis=1,
         result_type='expand',
     ),
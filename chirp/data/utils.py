@@ -32,6 +32,45 @@ _DEFAULT_TFDS_DATADIR = None
 _DEFAULT_PIPELINE = None
 
 
+def _get_read_config(shuffle_files: bool) -> tfds.ReadConfig:
+  """Returns the ReadConfig used to load datasets.
+
+  When shuffling files, the number of concurrently read shards is left to
+  tf.data, which overlaps shard-opening latency (dominant when the data lives
+  on network storage). Otherwise the fixed TFDS default is kept, since an
+  autotuned cycle length depends on the number of cores and would make the
+  order of unshuffled (e.g. evaluation) examples machine-dependent.
+
+  Args:
+    shuffle_files: Whether the dataset files are shuffled.
+
+  Returns:
+    The ReadConfig.
+  """
+  if not shuffle_files:
+    return tfds.ReadConfig(add_tfds_id=True)
+  return tfds.ReadConfig(
+      add_tfds_id=True, interleave_cycle_length=tf.data.AUTOTUNE
+  )
+
+
+def _with_options(ds: tf.data.Dataset) -> tf.data.Dataset:
+  """Enables tf.data map fusion, which is off by default.
+
+  Map fusion merges the map stages created by consecutive dataset ops.
+  Determinism is left to the individual ops.
+
+  Args:
+    ds: The dataset.
+
+  Returns:
+    The dataset with the options applied.
+  """
+  options = tf.data.Options()
+  options.experimental_optimization.map_fusion = True
+  return ds.with_options(options)
+
+
 def get_dataset(
     split: str,
     is_train: bool = False,
@@ -70,7 +109,7 @@ def get_dataset(
         'data_utils.get_dataset() requires a valid initialized Pipeline object '
         'to be specified.'
     )
-  read_config = tfds.ReadConfig(add_tfds_id=True)
+  read_config = _get_read_config(shuffle_files=is_train)
 
   datasets = []
   dataset_info = None
@@ -99,6 +138,9 @@ def get_dataset(
   else:
     ds = datasets[0]
 
+  # Options must be set before distributing, since data service workers run the
+  # graph as it is at that point.
+  ds = _with_options(ds)
   if is_train and tf_data_service_address:
     ds = ds.apply(
         tf.data.experimental.service.distribute(
@@ -107,7 +149,7 @@ def get_dataset(
             job_name='chirp_job',
         )
     )
-  ds = ds.prefetch(2)
+  ds = ds.prefetch(tf.data.AUTOTUNE)
   if dataset_info is None:
     raise RuntimeError('No datasets loaded.')
   return ds, dataset_info
@@ -138,7 +180,7 @@ def get_base_dataset(
     ValueError: If no initialized Pipeline is passed.
     RuntimeError: If no datasets are loaded.
   """
-  read_config = tfds.ReadConfig(add_tfds_id=True)
+  read_config = _get_read_config(shuffle_files=is_train)
 
   if tfds_data_dir:
     tfds.core.add_data_dir(tfds_data_dir)
@@ -201,8 +243,7 @@ def get_multi_dataset(
   if weights is not None and len(weights) != num_datasets:
     raise ValueError('Length of weights does not match number of datasets.')
 
-  peek_datasets = []
-  base_datasets = []
+  processed_datasets = []
   dataset_infos = []
   for dataset_dir, ds_pipeline, tfds_data_dir in zip(
       dataset_directories, pipelines, tfds_data_dirs
@@ -210,24 +251,25 @@ def get_multi_dataset(
     ds, dataset_info = get_base_dataset(
         split, is_train, dataset_dir, tfds_data_dir
     )
-    base_datasets.append(ds)
     dataset_infos.append(dataset_info)
     # Construct the actual Pipeline object from the config
     ds = ds_pipeline(ds, dataset_info)
-    peek_datasets.append(ds)
-
-  # Unify Datasets by adding placeholders for missing features in each
-  merge_op = pipeline_.AddTensorOp.from_datasets(peek_datasets)
-  merge_datasets = []
-  for base_dataset, pipeline, dataset_info in zip(
-      base_datasets, pipelines, dataset_infos
-  ):
-    new_ops = tuple(pipeline.ops) + (merge_op,)
-    new_pipeline = pipeline_.Pipeline(
-        new_ops, pipeline.num_parallel_calls, pipeline.deterministic
-    )
-    ds = new_pipeline(base_dataset, dataset_info)
-    merge_datasets.append(ds)
+    processed_datasets.append(ds)
+
+  # Unify Datasets by adding placeholders for missing features in each. The
+  # merge op is a DatasetPreprocessOp, so applying it to the already processed
+  # datasets is equivalent to appending it to each pipeline, without building
+  # every pipeline a second time. Note that from_datasets iterates each
+  # processed dataset once to read its shapes, so training starts on their
+  # second iteration: with reshuffling, a seeded Shuffle yields a different (but
+  # still seeded) order than a fresh dataset would. This is accepted, since
+  # peeking at element_spec instead would lose the concrete shapes needed for
+  # the zeros.
+  merge_op = pipeline_.AddTensorOp.from_datasets(processed_datasets)
+  merge_datasets = [
+      merge_op(ds, dataset_info)
+      for ds, dataset_info in zip(processed_datasets, dataset_infos)
+  ]
 
   # Create a new dataset object that interleaves the multiple datasets
   unified_ds = tf.data.Dataset.sample_from_datasets(
@@ -237,7 +279,9 @@ def get_multi_dataset(
   # Batch wants ds_info as an arg, but doesnt use it, so pass the last ds_info
   # TODO(benwilliamsgpt): allow Pipeline to take None as dataset_info
   unified_ds = final_pipeline(unified_ds, dataset_infos[-1])
-  unified_ds = unified_ds.prefetch(tf.data.experimental.AUTOTUNE)
+  unified_ds = _with_options(unified_ds).prefetch(
+      tf.data.experimental.AUTOTUNE
+  )
 
   # Handle distributed data loading
   if is_train and tf_data_service_address:
@@ -640,7 +640,7 @@ def read_embedded_dataset(
   fns = [fn for fn in output_dir.glob('embeddings-*')]
   ds = tf.data.TFRecordDataset(fns)
   parser = tf_examples.get_example_parser(tensor_dtype=tensor_dtype)
-  ds = ds.map(parser)
+  ds = ds.map(parser, num_parallel_calls=tf.data.AUTOTUNE)
 
   labels = labels_from_folder_of_folders(base_dir, exclude_classes)
 
@@ -121,7 +121,7 @@ def get_existing_source_ids(
   filenames = [fn for fn in output_dir.glob(file_pattern)]
   dataset = tf.data.TFRecordDataset(filenames)
   parser = tf_examples.get_example_parser(tensor_dtype=tensor_dtype)
-  dataset = dataset.map(parser)
+  dataset = dataset.map(parser, num_parallel_calls=tf.data.AUTOTUNE)
   for e in dataset.as_numpy_iterator():
     existing_source_ids.add(
         SourceId(str(e['filename'], 'UTF_8'), e['timestamp_s'])
@@ -16,6 +16,7 @@
 """Data pipeline functions."""
 
 import dataclasses
+import math
 from typing import Any, Iterable, Sequence, Tuple
 
 from absl import logging
@@ -34,6 +35,33 @@ import tensorflow_io as tfio
 Features = dict[str, tf.Tensor]
 
 
+def _multi_hot(
+    labels: tf.Tensor, num_classes: int, dtype: tf.DType = tf.int32
+) -> tf.Tensor:
+  """Converts a sequence of label indices to a multi-hot vector.
+
+  The labels are scattered directly into a [num_classes] vector, rather than
+  reducing a [len(labels), num_classes] one-hot matrix. Like `tf.one_hot`,
+  labels outside [0, num_classes) are ignored.
+
+  Args:
+    labels: A 1-D tensor of label indices.
+    num_classes: The size of the multi-hot vector.
+    dtype: The dtype of the multi-hot vector.
+
+  Returns:
+    A [num_classes] tensor which is 1 for every class in labels and 0 otherwise.
+  """
+  # tf.scatter_nd raises on out-of-range indices, so those are dropped first.
+  labels = tf.boolean_mask(labels, (labels >= 0) & (labels < num_classes))
+  counts = tf.scatter_nd(
+      indices=labels[:, tf.newaxis],
+      updates=tf.ones_like(labels, dtype=dtype),
+      shape=[num_classes],
+  )
+  return tf.minimum(counts, 1)
+
+
 class FeaturesPreprocessOp:
   """Preprocessing op which applies changes to specific features."""
 
@@ -153,7 +181,7 @@ class Pad(FeaturesPreprocessOp):
     for name in self.names:
       if name not in features:
         continue
-      padding = tf.reduce_max([window_size - tf.shape(features[name])[-1], 0])
+      padding = tf.maximum(window_size - tf.shape(features[name])[-1], 0)
       if self.random:
         left_pad = tf.random.uniform(
             shape=(), minval=0, maxval=padding + 1, dtype=tf.int32
@@ -166,10 +194,11 @@ class Pad(FeaturesPreprocessOp):
           (left_pad, right_pad),
       )
 
-      mask = tf.ones_like(features[name])
-      padded_mask = tf.pad(mask, paddings)
+      # Only build the mask when it is requested; most inputs are already
+      # longer than the window, in which case tf.pad forwards its input.
       if self.add_mask:
-        features[f'{name}_mask'] = padded_mask
+        mask = tf.ones_like(features[name])
+        features[f'{name}_mask'] = tf.pad(mask, paddings)
 
       features[name] = tf.pad(features[name], paddings)
     return features
@@ -260,14 +289,34 @@ class Slice(FeaturesPreprocessOp):
       self, features: Features, dataset_info: tfds.core.DatasetInfo
   ) -> Features:
     sample_rate = self.get_sample_rate(dataset_info)
-    window_size = tf.cast(self.window_size * sample_rate, tf.int64)
-    start = tf.cast(self.start * sample_rate, tf.int64)
+    window_size = int(self.window_size * sample_rate)
+    start = int(self.start * sample_rate)
+    return self.slice_window(features, self.names, start, window_size)
+
+  @staticmethod
+  def slice_window(
+      features: Features,
+      names: Sequence[str],
+      start: int | tf.Tensor,
+      window_size: int,
+  ) -> Features:
+    """Slices the same window of the last axis of each of the named features.
 
+    Args:
+      features: The features to slice.
+      names: The names of the features to slice. Missing features are skipped.
+      start: The start of the window, in samples.
+      window_size: The size of the window, in samples.
+
+    Returns:
+      A copy of features with the named features sliced.
+    """
     features = features.copy()
-    for name in self.names:
+    end = start + window_size
+    for name in names:
       if name not in features:
         continue
-      features[name] = features[name][..., start : start + window_size]
+      features[name] = features[name][..., start:end]
     return features
 
 
@@ -291,11 +340,14 @@ class RandomSlice(FeaturesPreprocessOp):
       self, features: Features, dataset_info: tfds.core.DatasetInfo
   ) -> Features:
     sample_rate = self.get_sample_rate(dataset_info)
-    audio_len = tf.shape(features[self.names[0]])[-1] / sample_rate
-    max_start = tf.cast(audio_len - self.window_size, tf.float32)
-    start = tf.random.uniform(shape=(), minval=0, maxval=max_start)
-
-    return Slice(self.window_size, start, self.names)(features, dataset_info)
+    # The window size is static, so it is computed in samples once at trace
+    # time and the start is drawn directly in samples.
+    window_size = int(self.window_size * sample_rate)
+    max_start = tf.shape(features[self.names[0]])[-1] - window_size
+    start = tf.random.uniform(
+        shape=(), minval=0, maxval=tf.maximum(max_start, 0) + 1, dtype=tf.int32
+    )
+    return Slice.slice_window(features, self.names, start, window_size)
 
 
 @dataclasses.dataclass
@@ -329,19 +381,28 @@ class NormalizeAudio(FeaturesPreprocessOp):
     for name in self.names:
       if name not in features:
         continue
-      features[name] = features[name] * tf.reshape(
-          gain_scalar,
-          tf.concat(
-              [
-                  tf.shape(gain_scalar),
-                  tf.ones(
-                      [tf.rank(features[name]) - tf.rank(gain_scalar)],
-                      dtype=tf.int32,
-                  ),
-              ],
-              axis=0,
-          ),
-      )
+      rank = features[name].shape.rank
+      if rank is not None and gain_scalar.shape.rank is not None:
+        # With static ranks the gain is broadcast with trailing unit axes added
+        # at trace time, rather than computing the broadcast shape per example.
+        gain = gain_scalar
+        for _ in range(rank - gain_scalar.shape.rank):
+          gain = gain[..., tf.newaxis]
+        features[name] = features[name] * gain
+      else:
+        features[name] = features[name] * tf.reshape(
+            gain_scalar,
+            tf.concat(
+                [
+                    tf.shape(gain_scalar),
+                    tf.ones(
+                        [tf.rank(features[name]) - tf.rank(gain_scalar)],
+                        dtype=tf.int32,
+                    ),
+                ],
+                axis=0,
+            ),
+        )
     return features
 
 
@@ -474,25 +535,27 @@ class MixAudio(DatasetPreprocessOp):
 
   def _key_func(self, features: Features) -> tf.Tensor:
     del features
-    target_dist = tf.constant(self.target_dist, dtype=tf.float32)
-    sample_dist = target_dist * (
-        tf.range(len(self.target_dist), dtype=tf.float32) + 1.0
-    )
-    return tf.squeeze(tf.random.categorical(tf.math.log([sample_dist]), 1))
+    # A mixture of i + 1 sources consumes i + 1 examples. The distribution is
+    # static, so its logits are computed in Python rather than per example.
+    logits = [
+        math.log(p * (i + 1)) if p > 0 else -math.inf
+        for i, p in enumerate(self.target_dist)
+    ]
+    return tf.squeeze(tf.random.categorical([logits], 1))
 
   def _reduce_func(
       self, key: tf.Tensor, dataset: tf.data.Dataset
   ) -> tf.data.Dataset:
-    key = tf.cast(key, tf.int32)
-    # pylint: disable=g-long-lambda
-    return tf.switch_case(
-        key,
-        [
-            lambda i=i: dataset.batch(i + 1, drop_remainder=True).map(
-                self._mix_audio
-            )
-            for i in range(len(self.target_dist))
-        ],
+    # Each window holds key + 1 examples, so a single batch of the maximum size
+    # collects the whole window without switching on the key. Only the final
+    # window of the dataset can be incomplete, in which case it is dropped.
+    num_sources = tf.cast(key, tf.int32) + 1
+    return (
+        dataset.batch(len(self.target_dist))
+        .filter(
+            lambda features: tf.shape(features[self.name])[0] == num_sources
+        )
+        .map(self._mix_audio)
     )
 
   @staticmethod
@@ -514,25 +577,28 @@ class MixAudio(DatasetPreprocessOp):
     features[self.name] = tf.reduce_sum(source_audio, axis=0)
 
     # To enable batching we pad with zeros
-    if source_audio.shape[0] < len(self.target_dist):
-      p = len(self.target_dist) - source_audio.shape[0]
-      source_audio = self._pad_along_axis(source_audio, [0, p], axis=0)
-      if self.axis:
-        source_audio = tf.experimental.numpy.swapaxes(
-            source_audio, 0, self.axis
-        )
-      for name in self.pad_names:
-        if name not in features:
-          continue
-        features[name] = self._pad_along_axis(features[name], [0, p], axis=0)
-        if self.axis:
-          features[name] = tf.experimental.numpy.swapaxes(
-              features[name], 0, self.axis
-          )
+    num_sources = len(self.target_dist)
+    p = num_sources - tf.shape(source_audio)[0]
+    source_audio = self._pad_to_num_sources(source_audio, p, num_sources)
+    for name in self.pad_names:
+      if name not in features:
+        continue
+      features[name] = self._pad_to_num_sources(features[name], p, num_sources)
 
     features[self.source_name] = source_audio
     return features
 
+  def _pad_to_num_sources(
+      self, tensor: tf.Tensor, paddings: tf.Tensor, num_sources: int
+  ) -> tf.Tensor:
+    """Pads the sources axis of tensor and moves it to self.axis."""
+    static_shape = tf.TensorShape([num_sources]).concatenate(tensor.shape[1:])
+    tensor = self._pad_along_axis(tensor, [0, paddings], axis=0)
+    tensor = tf.ensure_shape(tensor, static_shape)
+    if self.axis:
+      tensor = tf.experimental.numpy.swapaxes(tensor, 0, self.axis)
+    return tensor
+
 
 @dataclasses.dataclass
 class MultiHot(FeaturesPreprocessOp):
@@ -553,17 +619,8 @@ class MultiHot(FeaturesPreprocessOp):
     for name in self.names:
       if name not in features:
         continue
-      features[name] = tf.clip_by_value(
-          tf.reduce_sum(
-              tf.one_hot(
-                  features[name],
-                  dataset_info.features[name].feature.num_classes,
-                  dtype=tf.int32,
-              ),
-              axis=0,
-          ),
-          0,
-          1,
+      features[name] = _multi_hot(
+          features[name], dataset_info.features[name].feature.num_classes
       )
 
     return features
@@ -598,6 +655,34 @@ class AddChannel(FeaturesPreprocessOp):
     return features
 
 
+@dataclasses.dataclass
+class Cast(FeaturesPreprocessOp):
+  """Casts features to another dtype.
+
+  Casting audio to bfloat16 at the end of the pipeline halves the number of
+  bytes transferred to the accelerator. Place this after ops which accumulate
+  over the audio (e.g., `MixAudio`, `NormalizeAudio`) so that those are
+  computed in full precision.
+
+  Attributes:
+    dtype: The name of the dtype to cast to.
+    names: The name of the features to cast.
+  """
+
+  dtype: str = 'bfloat16'
+  names: tuple[str, ...] = ('audio', 'source_audio')
+
+  def __call__(
+      self, features: Features, dataset_info: tfds.core.DatasetInfo
+  ) -> Features:
+    features = features.copy()
+    for name in self.names:
+      if name not in features:
+        continue
+      features[name] = tf.cast(features[name], tf.as_dtype(self.dtype))
+    return features
+
+
 @dataclasses.dataclass
 class MelSpectrogram(FeaturesPreprocessOp):
   """Convert audio to a spectrogram.
@@ -782,10 +867,9 @@ class ConvertFSD50KLabels(FeaturesPreprocessOp):
     db = namespace_db.load_db()
     target_classes = db.class_lists[self.target_class_list]
     class_list_size = len(target_classes.classes)
-    encoded_labels = tf.reduce_sum(
-        tf.one_hot(int_labels_batch, class_list_size, dtype=tf.int64), axis=0
+    encoded_labels = _multi_hot(
+        int_labels_batch, class_list_size, dtype=tf.int64
     )
-    encoded_labels = tf.clip_by_value(encoded_labels, 0, 1)
 
     # Mask is all 1's
     mask = tf.ones([len(target_classes.classes)])
@@ -867,13 +951,7 @@ class ConvertReefLabels(FeaturesPreprocessOp):
     output_labels = tf.concat([soundtype_labels, int_labels_batch], axis=0)
     # Apply multihot encoding to the int's. Clip to be sure no 2's
     class_list_size = mask.shape[0]
-    output_labels = tf.clip_by_value(
-        tf.reduce_sum(
-            tf.one_hot(output_labels, class_list_size, dtype=tf.int64), axis=0
-        ),
-        0,
-        1,
-    )
+    output_labels = _multi_hot(output_labels, class_list_size, dtype=tf.int64)
     output_features.update(
         {'reef_label': output_labels, 'reef_label_mask': mask}
     )
@@ -998,13 +1076,7 @@ class ConvertBirdTaxonomyLabels(FeaturesPreprocessOp):
     output_labels = tf.gather(output_labels, tf.where(output_labels >= 0)[:, 0])
     # Convert to MultiHot encoding.
     class_list_size = label_mask.shape[0]
-    output_labels = tf.clip_by_value(
-        tf.reduce_sum(
-            tf.one_hot(output_labels, class_list_size, dtype=tf.int64), axis=0
-        ),
-        0,
-        1,
-    )
+    output_labels = _multi_hot(output_labels, class_list_size, dtype=tf.int64)
     return {output_key: output_labels, output_key + '_mask': label_mask}
 
   def convert_features(
@@ -1259,6 +1331,9 @@ class Batch(DatasetPreprocessOp):
       dataset = dataset.batch(
           self.batch_size // jax.device_count(), drop_remainder=True
       )
+      # Buffer per-device batches so that producing them overlaps with
+      # assembling (and consuming) the per-host batches.
+      dataset = dataset.prefetch(tf.data.AUTOTUNE)
       return dataset.batch(
           jax.local_device_count(), drop_remainder=self.drop_remainder
       )
@@ -1328,11 +1403,11 @@ class ExtractStridedWindows(DatasetPreprocessOp):
       return example
 
     # Unbatching yields slices one by one.
-    return dataset.map(map_fn).unbatch()
+    return dataset.map(map_fn, num_parallel_calls=tf.data.AUTOTUNE).unbatch()
 
 
 @dataclasses.dataclass
-class DenselyAnnotateWindows(DatasetPreprocessOp):
+class DenselyAnnotateWindows(FeaturesPreprocessOp):
   """Densely annotates sliding windows of the dataset's 'audio'.
 
   After extracting slided windows on the dataset's 'audio' feature, this
@@ -1366,8 +1441,8 @@ class DenselyAnnotateWindows(DatasetPreprocessOp):
   drop_annotation_bounds: bool = False
 
   def __call__(
-      self, dataset: tf.data.Dataset, dataset_info: tfds.core.DatasetInfo
-  ) -> tf.data.Dataset:
+      self, features: Features, dataset_info: tfds.core.DatasetInfo
+  ) -> Features:
     sample_rate = self.get_sample_rate(dataset_info)
     overlap_threshold = (
         1
@@ -1375,73 +1450,73 @@ class DenselyAnnotateWindows(DatasetPreprocessOp):
         else int(sample_rate * self.overlap_threshold_sec)
     )
 
-    def map_fn(example):
-      example = example.copy()
-
-      # A window and an annotated segment overlaps (by at least
-      # `overlap_threshold`) if the following is true:
-      #     max(segment_start, annotation_start)
-      #       <= min(segment_end, annotation_end) - overlap_threshold
-      # Note that `example['segment_{start|end}']` is uint64-valued and
-      # `example['annotation_{start|end}']` is a variable-length sequence of
-      # integers and the operation is broadcasted across all segments.
-
-      # Find the start and end of he intersection of the annotation and segment.
-      # If inter_end < inter_start, the intersection is empty.
-      inter_end = tf.cast(
-          tf.minimum(example['segment_end'], example['annotation_end']),
-          tf.int64,
-      )
-      inter_start = tf.cast(
-          tf.maximum(example['segment_start'], example['annotation_start']),
-          tf.int64,
-      )
-      overlap_comparison = tf.cast(
-          inter_end - inter_start - overlap_threshold >= 0, tf.bool
-      )
-      overlap_indices = tf.reshape(tf.where(overlap_comparison), [-1])
-
-      if self.drop_annotation_bounds:
-        del example['annotation_start']
-        del example['annotation_end']
-      else:
-        # Add per-label annotation metadata. When a label is not present, these
-        # data default to zero.
-        # Note: In case a segment has multiple annotations for the same species,
-        # only one annotation will be described by these metadata.
-        num_classes = len(dataset_info.features['label'].names)
-        label_idxs = tf.gather(example['label'], overlap_indices)
-        example['intersection_size'] = tf.maximum(inter_end - inter_start, 0)
-        example['annotation_length'] = tf.cast(
-            example['annotation_end'], tf.int64
-        ) - tf.cast(example['annotation_start'], tf.int64)
-
-        for k in (
-            'annotation_start',
-            'annotation_end',
-            'intersection_size',
-            'annotation_length',
-        ):
-          example[k] = tf.cast(tf.gather(example[k], overlap_indices), tf.int64)
-          example[k] = tf.scatter_nd(
-              indices=label_idxs[:, tf.newaxis],
-              updates=example[k],
-              shape=[num_classes],
-          )
+    example = features.copy()
+
+    # A window and an annotated segment overlaps (by at least
+    # `overlap_threshold`) if the following is true:
+    #     max(segment_start, annotation_start)
+    #       <= min(segment_end, annotation_end) - overlap_threshold
+    # Note that `example['segment_{start|end}']` is uint64-valued and
+    # `example['annotation_{start|end}']` is a variable-length sequence of
+    # integers and the operation is broadcasted across all segments.
+
+    # Find the start and end of he intersection of the annotation and segment.
+    # If inter_end < inter_start, the intersection is empty.
+    inter_end = tf.cast(
+        tf.minimum(example['segment_end'], example['annotation_end']),
+        tf.int64,
+    )
+    inter_start = tf.cast(
+        tf.maximum(example['segment_start'], example['annotation_start']),
+        tf.int64,
+    )
+    overlap_comparison = tf.cast(
+        inter_end - inter_start - overlap_threshold >= 0, tf.bool
+    )
+    overlap_indices = tf.reshape(tf.where(overlap_comparison), [-1])
 
-      example['label'] = tf.gather(example['label'], overlap_indices)
-      return example
+    if self.drop_annotation_bounds:
+      del example['annotation_start']
+      del example['annotation_end']
+    else:
+      # Add per-label annotation metadata. When a label is not present, these
+      # data default to zero.
+      # Note: In case a segment has multiple annotations for the same species,
+      # only one annotation will be described by these metadata.
+      num_classes = len(dataset_info.features['label'].names)
+      label_idxs = tf.gather(example['label'], overlap_indices)
+      example['intersection_size'] = tf.maximum(inter_end - inter_start, 0)
+      example['annotation_length'] = tf.cast(
+          example['annotation_end'], tf.int64
+      ) - tf.cast(example['annotation_start'], tf.int64)
+
+      for k in (
+          'annotation_start',
+          'annotation_end',
+          'intersection_size',
+          'annotation_length',
+      ):
+        example[k] = tf.cast(tf.gather(example[k], overlap_indices), tf.int64)
+        example[k] = tf.scatter_nd(
+            indices=label_idxs[:, tf.newaxis],
+            updates=example[k],
+            shape=[num_classes],
+        )
 
-    # TODO(tomdenton): We should refactor this into a FeaturesPreprocessOp.
-    # Refactoring will allow grouping it with other ops and
-    # reduce the total number of dataset.map calls, thus saving parallelism.
-    return dataset.map(map_fn)
+    example['label'] = tf.gather(example['label'], overlap_indices)
+    return example
 
 
 @dataclasses.dataclass
 class Cache(DatasetPreprocessOp):
   """Caches the dataset.
 
+  Place this after deterministic preprocessing (e.g., label conversion) and
+  before shuffling and random augmentations (e.g., `RandomSlice`), otherwise
+  the random choices of the first epoch are replayed in every epoch. The cache
+  also replays the file order of the first epoch, so a `Shuffle` placed after
+  it only mixes examples within its buffer.
+
   Attributes:
     filename: Where to cache the dataset. If left empty, the dataset is cached
       in memory.
@@ -1575,25 +1650,9 @@ class AddTensorOp(DatasetPreprocessOp):
       return features
 
     # Apply the transformation to each item in the dataset
-    augmented_dataset = dataset.map(add_tensors)
-
-    return augmented_dataset
-
-  def __call__(
-      self, dataset: tf.data.Dataset, dataset_info: tfds.core.DatasetInfo
-  ) -> tf.data.Dataset:
-    """Adds missing tensors to the dataset based on the unified_info."""
-
-    def add_tensors(features):
-      for key, (shape, dtype) in self.unified_shape_info.items():
-        if key not in features:
-          # fill the tensor with zeros:
-          tensor = tf.zeros(shape, dtype=dtype)
-          features[key] = tensor
-      return features
-
-    # Apply the transformation to each item in the dataset
-    augmented_dataset = dataset.map(add_tensors)
+    augmented_dataset = dataset.map(
+        add_tensors, num_parallel_calls=tf.data.AUTOTUNE
+    )
 
     return augmented_dataset
 
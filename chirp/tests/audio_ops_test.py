@@ -0,0 +1,43 @@
+# coding=utf-8
+# Copyright 2024 The Perch Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests for chirp.birb_sep_paper.audio_ops."""
+from chirp.birb_sep_paper import audio_ops
+import numpy as np
+import tensorflow as tf
+
+from absl.testing import absltest
+
+
+class AudioOpsTest(absltest.TestCase):
+
+  def test_rolled_mask(self):
+    length = 7
+    mask_length = tf.constant([0, 2, 3, 6], dtype=tf.int64)
+    shifts = tf.constant([3, 0, 5, 6], dtype=tf.int64)
+    mask = audio_ops.RolledMask(mask_length, shifts, length)
+
+    # Reference: mask the first mask_length[b] entries, then roll each row.
+    unrolled = tf.range(length, dtype=tf.int64)[tf.newaxis] >= (
+        mask_length[:, tf.newaxis]
+    )
+    expected = tf.stack(
+        [tf.roll(unrolled[b], shifts[b], axis=0) for b in range(4)]
+    )
+    np.testing.assert_array_equal(mask, expected)
+
+
+if __name__ == "__main__":
+  absltest.main()
@@ -21,6 +21,7 @@ import tempfile
 
 from chirp.data import filter_scrub_utils as fsu
 from chirp.train_tests import fake_dataset
+import numpy as np
 import pandas as pd
 import tensorflow_datasets as tfds
 
@@ -177,6 +178,65 @@ class ScrubTest(DataProcessingTest):
     )
     self.assertEqual(expected_df.to_dict(), test_df.to_dict())
 
+  def test_make_scrub(self):
+    """Ensure a prebuilt scrubbing function can be reused across rows."""
+    scrub_fn = fsu.make_scrub('bg_labels', ['ostric3', 'grerhe1'], all_but=True)
+    test_df = self.toy_df.apply(scrub_fn, axis=1, result_type='expand')
+    self.assertEqual(
+        test_df['bg_labels'].tolist(),
+        [['ostric3', 'grerhe1'], ['grerhe1'], ['ostric3']],
+    )
+
+  def test_make_scrub_checks_each_element_type(self):
+    """Ensure type checks are cached per element type, not per function."""
+    scrub_fn = fsu.make_scrub('bg_labels', ['ostric3'])
+    self.assertEqual(
+        scrub_fn({'bg_labels': ['ostric2', 'ostric3']})['bg_labels'],
+        ['ostric2'],
+    )
+    # A row with another element type is still checked against `values`, and
+    # a failed check is not cached.
+    for _ in range(2):
+      with self.assertRaises(TypeError):
+        scrub_fn({'bg_labels': [b'ostric2', b'ostric3']})
+    # Rows with the already checked type keep working.
+    self.assertEqual(
+        scrub_fn({'bg_labels': ['ostric3', 'grerhe1']})['bg_labels'],
+        ['grerhe1'],
+    )
+
+  def test_make_scrub_unhashable_values(self):
+    """Ensure unhashable values are scrubbed with linear membership tests."""
+    scrub_fn = fsu.make_scrub('annotations', [[0, 1]], replace_value=[])
+    self.assertEqual(
+        scrub_fn({'annotations': [[0, 1], [2, 3]]})['annotations'],
+        [[], [2, 3]],
+    )
+
+  def test_scrubbing_numeric_array(self):
+    """Ensure numeric ndarrays are scrubbed and remain ndarrays."""
+    row = {'label': np.array([3, 1, 4, 1, 5], dtype=np.int64)}
+    values = [np.int64(1), np.int64(5)]
+
+    scrubbed = fsu.scrub(row, 'label', values)
+    self.assertIsInstance(scrubbed['label'], np.ndarray)
+    np.testing.assert_array_equal(scrubbed['label'], [3, 4])
+
+    scrubbed = fsu.scrub(row, 'label', values, all_but=True)
+    np.testing.assert_array_equal(scrubbed['label'], [1, 1, 5])
+
+    scrubbed = fsu.scrub(row, 'label', values, replace_value=0)
+    np.testing.assert_array_equal(scrubbed['label'], [3, 0, 4, 0, 0])
+
+  def test_scrubbing_numeric_array_with_foreign_replace_value(self):
+    """Ensure a replace_value of another dtype does not promote arrays."""
+    row = {'label': np.array([3, 1, 4, 1, 5], dtype=np.int64)}
+    values = [np.int64(1), np.int64(5)]
+
+    scrubbed = fsu.scrub(row, 'label', values, replace_value='unknown')
+    self.assertEqual(scrubbed['label'], [3, 'unknown', 4, 'unknown', 'unknown'])
+    self.assertIsInstance(scrubbed['label'][0], np.int64)
+
   def test_scrub_no_side_effects(self):
     """Ensure scrubbing operation does not have side-effects."""
     df = self.fake_df.copy()
@@ -90,6 +90,29 @@ class PipelineTest(parameterized.TestCase):
         else:
           np.testing.assert_equal(x[key], y[key], err_msg=f'{key} not equal')
 
+  def test_mix_audio_labels(self):
+    features = {
+        'audio': tf.random.uniform([2, 100], dtype=tf.float32),
+        'label': tf.constant([[1, 0, 0], [0, 0, 1]], dtype=tf.int32),
+        'label_mask': tf.constant([[1, 1, 0], [0, 1, 0]], dtype=tf.float32),
+        'bg_labels': tf.constant([[0, 1], [0, 0]], dtype=tf.int64),
+        'genus': tf.constant([[0, 1], [1, 0]], dtype=tf.int32),
+        'audio_mask': tf.constant(
+            [[1] * 100, [1] * 60 + [0] * 40], dtype=tf.float32
+        ),
+    }
+    expected = {
+        name: tf.reduce_max(features[name], axis=0)
+        for name in ('label', 'label_mask', 'bg_labels', 'genus', 'audio_mask')
+    }
+    mixed = pipeline.MixAudio(mixin_prob=1.0)._mix_audio(dict(features))
+    for name, value in expected.items():
+      self.assertEqual(mixed[name].dtype, value.dtype)
+      np.testing.assert_array_equal(mixed[name], value, err_msg=name)
+    np.testing.assert_allclose(
+        mixed['audio'], tf.reduce_sum(features['audio'], axis=0)
+    )
+
   def test_process_example(self):
     sample_rate_hz = self._builder.info.features['audio'].sample_rate
     audio_length_s = 6
@@ -472,8 +495,8 @@ class PipelineTest(parameterized.TestCase):
         }
     )
     original_dataset = tf.data.Dataset.from_tensors(original_example)
-    annotated_dataset = pipeline.DenselyAnnotateWindows(
-        overlap_threshold_sec=0
+    annotated_dataset = pipeline.Pipeline(
+        [pipeline.DenselyAnnotateWindows(overlap_threshold_sec=0)]
     )(original_dataset, fake_dataset_info)
     annotated_dataset = next(annotated_dataset.as_numpy_iterator())
 
@@ -504,8 +527,8 @@ class PipelineTest(parameterized.TestCase):
         }
     )
     original_dataset = tf.data.Dataset.from_tensors(original_example)
-    annotated_dataset = pipeline.DenselyAnnotateWindows(
-        overlap_threshold_sec=1
+    annotated_dataset = pipeline.Pipeline(
+        [pipeline.DenselyAnnotateWindows(overlap_threshold_sec=1)]
     )(original_dataset, fake_dataset_info)
     annotated_dataset = next(annotated_dataset.as_numpy_iterator())
 
@@ -564,6 +587,49 @@ class PipelineTest(parameterized.TestCase):
         tf.shape(zero_pad_example['audio'])[-1],
     )
 
+  def test_random_slice(self):
+    sample_rate_hz = 10
+    example = {
+        'audio': tf.range(100, dtype=tf.float32),
+        'audio_mask': tf.ones([100], dtype=tf.float32),
+    }
+    random_slice_op = pipeline.RandomSlice(
+        window_size=2.5, sample_rate=sample_rate_hz
+    )
+    for _ in range(10):
+      sliced = random_slice_op(example, self._builder.info)
+      self.assertEqual(sliced['audio'].shape, (25,))
+      self.assertEqual(sliced['audio_mask'].shape, (25,))
+      # The window is contiguous.
+      np.testing.assert_equal(
+          sliced['audio'].numpy(),
+          np.arange(25) + sliced['audio'].numpy()[0],
+      )
+
+  def test_multi_hot(self):
+    labels = tf.constant([1, 1, 3, -1, 7], dtype=tf.int64)
+    multi_hot = pipeline._multi_hot(labels, 5, dtype=tf.int64)
+    self.assertEqual(multi_hot.dtype, tf.int64)
+    # Duplicates are clamped to 1 and out-of-range labels are ignored, as with
+    # tf.one_hot.
+    np.testing.assert_array_equal(multi_hot, [0, 1, 0, 1, 0])
+    np.testing.assert_array_equal(
+        multi_hot,
+        tf.reduce_max(tf.one_hot(labels, 5, dtype=tf.int64), axis=0),
+    )
+
+  def test_cast(self):
+    example = {
+        'audio': tf.random.uniform([2, 100], dtype=tf.float32),
+        'label': tf.ones([2, 3], dtype=tf.int32),
+    }
+    cast_example = pipeline.Cast()(example, self._builder.info)
+    self.assertEqual(cast_example['audio'].dtype, tf.bfloat16)
+    self.assertEqual(cast_example['label'].dtype, tf.int32)
+    np.testing.assert_allclose(
+        tf.cast(cast_example['audio'], tf.float32), example['audio'], rtol=1e-2
+    )
+
   def test_AddTensorOp(self):
     """Test for combined datasets."""
     # Define some sample datasets
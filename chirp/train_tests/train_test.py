@@ -23,6 +23,7 @@ from chirp.configs import baseline
 from chirp.configs import baseline_attention
 from chirp.configs import baseline_mel_conformer
 from chirp.configs import config_globals
+from chirp.configs import presets
 from chirp.data import utils as data_utils
 from chirp.models import efficientnet
 from chirp.models import frontend
@@ -157,6 +158,26 @@ class TrainTest(parameterized.TestCase):
         jax.tree_util.tree_structure(test_config.to_dict()),
     )
 
+  def test_supervised_train_pipeline_with_cache(self):
+    config = presets.get_base_config()
+    train_dataset_config = presets.get_supervised_train_pipeline(
+        config, mixin_prob=0.75, train_dataset_dir="dir", cache_filename=""
+    )
+    train_dataset_config = config_utils.parse_config(
+        train_dataset_config, config_globals.get_globals()
+    )
+    self.assertEqual(
+        [type(op) for op in train_dataset_config.pipeline.ops[:5]],
+        [
+            pipeline.OnlyJaxTypes,
+            pipeline.ConvertBirdTaxonomyLabels,
+            pipeline.Cache,
+            pipeline.Shuffle,
+            pipeline.RandomNormalizeAudio,
+        ],
+    )
+    self.assertEqual(train_dataset_config.pipeline.ops[2].filename, "")
+
   def test_export_model(self):
     # NOTE: This test might fail when run on a machine that has a GPU but when
     # CUDA is not linked (JAX will detect the GPU so jax2tf will try to create